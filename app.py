@@ -12,11 +12,13 @@ Python Streamlit을 사용한 가계부 관리 시스템
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px  # pyright: ignore[reportMissingImports]
-import plotly.graph_objects as go  # pyright: ignore[reportMissingImports]
-from datetime import datetime, date
-import json
+import numpy as np
+import orjson
+from datetime import date
 import os
+import time
+from collections import Counter
+from functools import lru_cache
 
 # 페이지 설정
 st.set_page_config(
@@ -28,6 +30,17 @@ st.set_page_config(
 # 데이터 파일 경로
 DATA_FILE = "household_data.json"
 
+# 가계부 데이터 열 구성
+DATA_COLUMNS = ['날짜', '품목', '제품명', '가격', '개수', '개당가격', '전체가격']
+
+# DataFrame 생성 시 고정할 열 형식 (개수는 정수로 추론되도록 그대로 둡니다)
+COLUMN_DTYPES = {
+    '날짜': 'datetime64[ns]',
+    '가격': 'float64',
+    '개당가격': 'float64',
+    '전체가격': 'float64',
+}
+
 # 품목 카테고리 및 키워드 매핑
 CATEGORY_KEYWORDS = {
     "식비": ["음식", "식당", "배달", "카페", "커피", "점심", "저녁", "아침", "간식", "치킨", "피자", "햄버거"],
@@ -40,39 +53,132 @@ CATEGORY_KEYWORDS = {
     "기타": []
 }
 
+# (품목, 소문자 키워드 집합) 목록 - 추천 시 매번 다시 만들지 않도록 모듈 로드 시 한 번만 생성합니다.
+CATEGORY_INDEX = tuple(
+    (category, frozenset(keyword.lower() for keyword in keywords))
+    for category, keywords in CATEGORY_KEYWORDS.items()
+)
+
+# (소문자 키워드, 품목) 목록
+KEYWORD_INDEX = tuple(
+    (keyword, category)
+    for category, keywords in CATEGORY_INDEX
+    for keyword in keywords
+)
+
 def parse_date_series(series: pd.Series) -> pd.Series:
     """
     날짜 형식을 일관되게 변환합니다.
-    서로 다른 문자열 포맷이 섞여 있어도 파싱할 수 있도록 cache를 비활성화합니다.
+    데이터를 불러올 때 한 번만 호출되며, 이후에는 datetime 형식의 열을 그대로 사용합니다.
     """
     if series.empty:
         return series
-    return pd.to_datetime(series, errors='coerce', cache=False)
+    return pd.to_datetime(series, errors='coerce', cache=True, format='ISO8601')
 
-def load_data():
-    """저장된 가계부 데이터를 불러옵니다."""
+def to_category_column(values):
+    """
+    품목 열을 categorical 형식으로 변환합니다.
+    기본 품목 외에 데이터에 저장된 품목도 카테고리에 포함하여 값이 사라지지 않도록 합니다.
+    """
+    extra_categories = sorted(set(values.dropna()) - set(CATEGORY_KEYWORDS), key=str)
+    return pd.Categorical(values, categories=list(CATEGORY_KEYWORDS) + extra_categories)
+
+@st.cache_data(show_spinner=False)
+def load_data(mtime: float):
+    """
+    저장된 가계부 데이터를 불러옵니다.
+    mtime(파일 수정 시각)을 캐시 키로 사용하여 파일이 바뀔 때만 다시 읽고 파싱합니다.
+    """
     if os.path.exists(DATA_FILE):
         try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(DATA_FILE, 'rb') as f:
+                data = orjson.loads(f.read())
                 df = pd.DataFrame(data)
                 if not df.empty and '날짜' in df.columns:
                     df['날짜'] = parse_date_series(df['날짜'])
+                if not df.empty and '품목' in df.columns:
+                    df['품목'] = to_category_column(df['품목'])
                 return df
         except:
-            return pd.DataFrame(columns=['날짜', '품목', '제품명', '가격', '개수', '개당가격', '전체가격'])
-    return pd.DataFrame(columns=['날짜', '품목', '제품명', '가격', '개수', '개당가격', '전체가격'])
+            return pd.DataFrame(columns=DATA_COLUMNS)
+    return pd.DataFrame(columns=DATA_COLUMNS)
 
 def save_data(df):
-    """가계부 데이터를 파일에 저장합니다."""
+    """
+    가계부 데이터를 파일에 저장합니다.
+    날짜 열은 pandas의 JSON 직렬화에서 ISO 형식으로 바로 변환됩니다.
+    """
     if not df.empty:
-        df_dict = df.to_dict('records')
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(df_dict, f, ensure_ascii=False, indent=2, default=str)
+        df.to_json(DATA_FILE, orient='records', force_ascii=False, date_format='iso', date_unit='s', indent=2)
     else:
-        # 빈 데이터프레임일 경우 빈 파일 생성
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False)
+        # 빈 데이터일 경우 빈 파일 생성
+        with open(DATA_FILE, 'wb') as f:
+            f.write(b"[]")
+    # 다음 실행 시 파일을 다시 읽도록 캐시를 비웁니다.
+    load_data.clear()
+
+def build_dataframe(records):
+    """
+    레코드 리스트로 DataFrame을 만듭니다.
+    열 형식은 COLUMN_DTYPES로 고정하고, 품목은 categorical 형식으로 저장합니다.
+    """
+    df = pd.DataFrame.from_records(records, columns=DATA_COLUMNS).astype(COLUMN_DTYPES)
+    df['품목'] = to_category_column(df['품목'])
+    return df
+
+def record_sort_key(record):
+    """레코드의 날짜 정렬 키를 반환합니다. 날짜가 없는 항목은 맨 뒤로 보냅니다."""
+    record_date = record.get('날짜')
+    if pd.isna(record_date):
+        return (True, pd.Timestamp.min)
+    return (False, record_date)
+
+def filter_by_date(df, start_date, end_date, include_end=True):
+    """
+    날짜순으로 정렬된 df에서 start_date ~ end_date 기간의 행을 반환합니다.
+    searchsorted로 구간 경계를 찾아 잘라내므로 전체 열을 비교하지 않습니다.
+    include_end가 False면 end_date는 포함하지 않습니다.
+    """
+    dates = df['날짜'].to_numpy()
+    lo = np.searchsorted(dates, pd.Timestamp(start_date).to_datetime64(), side='left')
+    hi = np.searchsorted(dates, pd.Timestamp(end_date).to_datetime64(), side='right' if include_end else 'left')
+    return df.iloc[lo:hi]
+
+def get_dataframe():
+    """
+    현재 세션의 가계부 데이터를 DataFrame으로 반환합니다.
+    만든 DataFrame은 데이터 버전과 함께 세션 상태에 보관하고, 버전이 바뀔 때만 다시 만듭니다.
+    """
+    if st.session_state.get('df_version') != st.session_state.data_version:
+        st.session_state.df = build_dataframe(st.session_state.records)
+        st.session_state.df_version = st.session_state.data_version
+    return st.session_state.df
+
+def get_filtered_dataframe(start_date, end_date, category):
+    """기간과 품목 조건에 맞는 행을 반환합니다."""
+    filtered_df = filter_by_date(get_dataframe(), start_date, end_date)
+    if category != "전체":
+        filtered_df = filtered_df[filtered_df['품목'] == category]
+    return filtered_df
+
+def get_date_bounds():
+    """
+    데이터의 최소/최대 날짜를 반환합니다.
+    데이터 버전이 바뀔 때만 다시 계산하고 세션 상태에 보관합니다.
+    """
+    if st.session_state.get('date_bounds_version') != st.session_state.data_version:
+        dates = get_dataframe()['날짜'].dropna()
+        if dates.empty:
+            st.session_state.date_min = st.session_state.date_max = date.today()
+        else:
+            st.session_state.date_min = dates.min().date()
+            st.session_state.date_max = dates.max().date()
+        st.session_state.date_bounds_version = st.session_state.data_version
+    return st.session_state.date_min, st.session_state.date_max
+
+def mark_data_changed():
+    """데이터가 변경되었음을 표시합니다. 캐시 키로 쓰이는 데이터 버전을 갱신합니다."""
+    st.session_state.data_version = time.monotonic_ns()
 
 def recommend_category(product_name):
     """
@@ -82,20 +188,38 @@ def recommend_category(product_name):
     if not product_name:
         return "기타"
     
-    product_lower = product_name.lower()
-    scores = {}
+    product_lower = product_name.lower().strip()
     
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        score = 0
-        for keyword in keywords:
-            if keyword in product_lower:
-                score += 1
-        scores[category] = score
+    # 제품명이 키워드와 정확히 일치하는 짧은 입력은 미리 계산한 결과를 바로 반환
+    exact_match = EXACT_KEYWORD_CATEGORY.get(product_lower)
+    if exact_match is not None:
+        return exact_match
+    return _best_category(product_lower)
+
+def _best_category(product_lower):
+    """소문자 제품명에 포함된 키워드 수가 가장 많은 품목을 반환합니다."""
+    scores = Counter(category for keyword, category in KEYWORD_INDEX if keyword in product_lower)
     
-    # 가장 높은 점수의 카테고리 반환
-    if max(scores.values()) > 0:
-        return max(scores, key=scores.get)
-    return "기타"
+    # 가장 높은 점수의 카테고리 반환 (동점이면 CATEGORY_KEYWORDS 순서상 앞선 품목)
+    return scores.most_common(1)[0][0] if scores else "기타"
+
+# 키워드 하나만 입력된 경우의 추천 결과
+EXACT_KEYWORD_CATEGORY = {keyword: _best_category(keyword) for keyword, _ in KEYWORD_INDEX}
+
+def recommend_categories(product_names):
+    """
+    제품명 Series 전체에 대해 품목을 한 번에 추천합니다. (일괄 가져오기, 키워드 변경 후 기존 내역 재분류 등)
+    키워드마다 str.contains를 한 번씩 실행해 recommend_category와 같은 점수를 벡터 연산으로 계산합니다.
+    """
+    names_lower = product_names.astype(str).str.lower()
+    scores = pd.DataFrame({
+        category: sum(names_lower.str.contains(keyword, regex=False) for keyword in keywords)
+        for category, keywords in CATEGORY_INDEX
+        if keywords
+    }, index=product_names.index)
+    
+    # 동점이면 CATEGORY_KEYWORDS 순서상 앞선 품목 (idxmax는 첫 번째 최댓값을 반환)
+    return scores.idxmax(axis=1).where(scores.max(axis=1) > 0, "기타")
 
 def validate_input(date_input, category, product_name, price, quantity):
     """
@@ -113,12 +237,13 @@ def validate_input(date_input, category, product_name, price, quantity):
     
     return errors
 
-def calculate_price(price, quantity, price_type):
+@lru_cache(maxsize=256)
+def calc_prices(price: float, quantity: int, is_unit: bool):
     """
-    가격을 계산합니다.
-    price_type: 'unit' (개당가격 입력) 또는 'total' (전체가격 입력)
+    가격을 계산하여 (개당가격, 전체가격)을 반환합니다.
+    is_unit: True면 개당가격 입력, False면 전체가격 입력
     """
-    if price_type == 'unit':
+    if is_unit:
         # 개당가격이 입력된 경우
         unit_price = price
         total_price = unit_price * quantity if quantity > 0 else unit_price
@@ -129,17 +254,18 @@ def calculate_price(price, quantity, price_type):
         unit_price = total_price / quantity if quantity > 0 else total_price
         return unit_price, total_price
 
-def analyze_expenditure(df, start_date, end_date, category_filter=None):
+@st.cache_data(show_spinner=False, max_entries=16)
+def analyze_expenditure(data_version, start_date, end_date, category_filter=None):
     """
     특정 기간의 지출을 분석합니다.
+    data_version과 조건이 같으면 캐시된 결과를 반환합니다.
     """
+    df = get_dataframe()
     if df.empty:
         return "데이터가 없습니다."
     
     # 날짜 필터링
-    df['날짜'] = parse_date_series(df['날짜'])
-    filtered_df = df[(df['날짜'] >= pd.to_datetime(start_date)) & 
-                     (df['날짜'] <= pd.to_datetime(end_date))]
+    filtered_df = filter_by_date(df, start_date, end_date)
     
     if filtered_df.empty:
         return "선택한 기간에 데이터가 없습니다."
@@ -157,40 +283,46 @@ def analyze_expenditure(df, start_date, end_date, category_filter=None):
     transaction_count = len(filtered_df)
     
     # 품목별 지출
-    category_expenditure = filtered_df.groupby('품목')['전체가격'].sum().sort_values(ascending=False)
+    category_expenditure = filtered_df.groupby('품목', observed=True)['전체가격'].sum().sort_values(ascending=False)
     
     # 개별 제품 구매 빈도
     product_frequency = filtered_df['제품명'].value_counts()
     
-    result = f"""
+    # 항목별 줄은 반복 문자열 연결 대신 join으로 한 번에 합칩니다
+    category_lines = "\n".join(
+        f"- {cat}: {amount:,.0f}원 ({amount / total_expenditure * 100:.1f}%)"
+        for cat, amount in category_expenditure.items()
+    )
+    product_lines = "\n".join(
+        f"- {product}: {count}회"
+        for product, count in product_frequency.head(5).items()
+    )
+    
+    return f"""
 **기간**: {start_date} ~ {end_date}
 **총 지출**: {total_expenditure:,.0f}원
 **평균 지출**: {avg_expenditure:,.0f}원
 **거래 횟수**: {transaction_count}회
 
 **품목별 지출**:
+{category_lines}
+
+**자주 구매한 제품 (상위 5개)**:
+{product_lines}
 """
-    for cat, amount in category_expenditure.items():
-        percentage = (amount / total_expenditure) * 100
-        result += f"- {cat}: {amount:,.0f}원 ({percentage:.1f}%)\n"
-    
-    result += f"\n**자주 구매한 제품 (상위 5개)**:\n"
-    for product, count in product_frequency.head(5).items():
-        result += f"- {product}: {count}회\n"
-    
-    return result
 
-def ai_analysis(df, start_date, end_date, user_query):
+@st.cache_data(show_spinner=False, max_entries=16)
+def ai_analysis(data_version, start_date, end_date, user_query):
     """
     사용자 쿼리를 기반으로 AI 분석을 수행합니다.
+    data_version과 조건이 같으면 캐시된 결과를 반환합니다.
     """
+    df = get_dataframe()
     if df.empty:
         return "데이터가 없습니다."
     
     # 날짜 필터링
-    df['날짜'] = parse_date_series(df['날짜'])
-    filtered_df = df[(df['날짜'] >= pd.to_datetime(start_date)) & 
-                     (df['날짜'] <= pd.to_datetime(end_date))]
+    filtered_df = filter_by_date(df, start_date, end_date)
     
     if filtered_df.empty:
         return "선택한 기간에 데이터가 없습니다."
@@ -200,7 +332,7 @@ def ai_analysis(df, start_date, end_date, user_query):
     prev_start = pd.to_datetime(start_date) - pd.Timedelta(days=period_days)
     prev_end = pd.to_datetime(start_date)
     
-    prev_df = df[(df['날짜'] >= prev_start) & (df['날짜'] < prev_end)]
+    prev_df = filter_by_date(df, prev_start, prev_end, include_end=False)
     
     result_sections = []
     query_lower = user_query.lower()
@@ -230,13 +362,13 @@ def ai_analysis(df, start_date, end_date, user_query):
     result_sections.append(("지출 경향 요약", trend_summary))
     
     # 품목 관련 상세 분석
-    current_category_exp = filtered_df.groupby('품목')['전체가격'].sum().sort_values(ascending=False)
+    current_category_exp = filtered_df.groupby('품목', observed=True)['전체가격'].sum().sort_values(ascending=False)
     category_focus = []
     
     categories_requested = [cat for cat in CATEGORY_KEYWORDS if cat.lower() in query_lower]
     focus_categories = categories_requested if categories_requested else list(current_category_exp.index)
     
-    prev_category_exp = prev_df.groupby('품목')['전체가격'].sum() if not prev_df.empty else pd.Series(dtype=float)
+    prev_category_exp = prev_df.groupby('품목', observed=True)['전체가격'].sum() if not prev_df.empty else pd.Series(dtype=float)
     
     if focus_categories:
         for category in focus_categories:
@@ -259,11 +391,6 @@ def ai_analysis(df, start_date, end_date, user_query):
     
     # 상위 지출 및 빈도
     top_categories = current_category_exp.head(3)
-    top_items = filtered_df.groupby('제품명').agg(
-        총지출=('전체가격', 'sum'),
-        구매횟수=('제품명', 'count'),
-        평균개수=('개수', 'mean')
-    ).sort_values(by='총지출', ascending=False).head(5)
     
     habit_lines = []
     if not top_categories.empty:
@@ -272,11 +399,11 @@ def ai_analysis(df, start_date, end_date, user_query):
         habit_lines.append(f"가장 큰 비중은 `{top_cat}`으로 총 지출의 {top_cat_share:.1f}%를 차지합니다.")
     
     if wants_frequency:
-        current_single = len(filtered_df[filtered_df['개수'] == 1])
+        current_single = int((filtered_df['개수'].to_numpy() == 1).sum())
         current_total_transactions = len(filtered_df)
         current_ratio = (current_single / current_total_transactions * 100) if current_total_transactions > 0 else 0
         if not prev_df.empty:
-            prev_single = len(prev_df[prev_df['개수'] == 1])
+            prev_single = int((prev_df['개수'].to_numpy() == 1).sum())
             prev_total_transactions = len(prev_df)
             prev_ratio = (prev_single / prev_total_transactions * 100) if prev_total_transactions > 0 else 0
             change = current_ratio - prev_ratio
@@ -285,7 +412,17 @@ def ai_analysis(df, start_date, end_date, user_query):
         else:
             habit_lines.append(f"낱개 구매 비중은 {current_ratio:.1f}%입니다.")
     
-    if not top_items.empty and (wants_frequency or wants_category_detail or wants_trend):
+    if wants_frequency or wants_category_detail or wants_trend:
+        # 제품별 지표는 한 번의 groupby로 함께 집계
+        top_items = filtered_df.groupby('제품명').agg(
+            총지출=('전체가격', 'sum'),
+            구매횟수=('제품명', 'size'),
+            평균개수=('개수', 'mean')
+        ).sort_values(by='총지출', ascending=False).head(5)
+    else:
+        top_items = pd.DataFrame()
+    
+    if not top_items.empty:
         items_summary = ", ".join([f"{row.Index}({row.구매횟수}회, {row.총지출:,.0f}원)" for row in top_items.itertuples()])
         habit_lines.append(f"주요 구매 품목: {items_summary}")
     
@@ -320,9 +457,114 @@ def ai_analysis(df, start_date, end_date, user_query):
     
     return "\n\n".join(formatted_sections) if formatted_sections else "분석할 수 있는 데이터가 부족합니다. 더 구체적인 질문을 해주세요."
 
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_daily_line_fig(data_version, start_date, end_date, category):
+    """일별 지출 추이 선 그래프를 만듭니다. 같은 데이터 버전(data_version)과 조건이면 캐시된 그래프를 반환합니다."""
+    # plotly는 통계 화면에서만 필요하므로 처음 사용할 때 불러옵니다.
+    import plotly.graph_objects as go  # pyright: ignore[reportMissingImports]
+    filtered_df = get_filtered_dataframe(start_date, end_date, category)
+    daily_expenditure = filtered_df.groupby(filtered_df['날짜'].dt.date)['전체가격'].sum().reset_index()
+    daily_expenditure.columns = ['날짜', '지출액']
+    
+    fig = go.Figure(go.Scatter(
+        x=daily_expenditure['날짜'].to_numpy(),
+        y=daily_expenditure['지출액'].to_numpy(),
+        mode='lines+markers'
+    ))
+    fig.update_layout(title=f"{category} 일별 지출 추이", xaxis_title="날짜", yaxis_title="지출액 (원)")
+    return fig
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_category_pie_fig(data_version, start_date, end_date, category):
+    """품목별 지출 비율 파이 차트를 만듭니다. 같은 데이터 버전(data_version)과 조건이면 캐시된 그래프를 반환합니다."""
+    import plotly.graph_objects as go  # pyright: ignore[reportMissingImports]
+    filtered_df = get_filtered_dataframe(start_date, end_date, category)
+    category_expenditure = filtered_df.groupby('품목', observed=True)['전체가격'].sum().reset_index()
+    category_expenditure.columns = ['품목', '지출액']
+    
+    fig = go.Figure(go.Pie(
+        labels=category_expenditure['품목'].to_numpy(),
+        values=category_expenditure['지출액'].to_numpy()
+    ))
+    fig.update_layout(title="품목별 지출 비율")
+    return fig
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_category_bar_fig(data_version, start_date, end_date, category):
+    """품목별 지출액 막대 그래프를 만듭니다. 같은 데이터 버전(data_version)과 조건이면 캐시된 그래프를 반환합니다."""
+    import plotly.graph_objects as go  # pyright: ignore[reportMissingImports]
+    filtered_df = get_filtered_dataframe(start_date, end_date, category)
+    category_expenditure = filtered_df.groupby('품목', observed=True)['전체가격'].sum().sort_values(ascending=False).reset_index()
+    category_expenditure.columns = ['품목', '지출액']
+    
+    amounts = category_expenditure['지출액'].to_numpy()
+    fig = go.Figure(go.Bar(
+        x=category_expenditure['품목'].to_numpy(),
+        y=amounts,
+        text=amounts,
+        texttemplate='%{text:,.0f}원',
+        textposition='outside'
+    ))
+    fig.update_layout(title="품목별 지출액", xaxis_title="품목", yaxis_title="지출액 (원)")
+    return fig
+
+# 가계부 입력 화면의 위젯 키 (항목 추가에 성공하면 초기화)
+ENTRY_WIDGET_KEYS = ['entry_product_name', 'entry_date', 'entry_category', 'entry_price_type', 'entry_price', 'entry_quantity']
+
+def on_product_name_change():
+    """제품명이 바뀌면 추천 품목을 품목 선택값으로 설정합니다."""
+    st.session_state.entry_category = recommend_category(st.session_state.entry_product_name)
+
+def submit_entry():
+    """
+    '항목 추가' 버튼 콜백입니다. 입력값을 검증한 뒤 항목을 추가합니다.
+    검증에 실패하면 입력값을 그대로 두고, 추가에 성공한 경우에만 입력 위젯을 초기화합니다.
+    """
+    state = st.session_state
+    purchase_date = state.entry_date
+    category = state.entry_category
+    product_name = state.entry_product_name
+    price = state.entry_price
+    quantity = state.entry_quantity
+    
+    # 필수 항목 검증
+    validation_errors = validate_input(
+        purchase_date, category, product_name, price, quantity
+    )
+    
+    if validation_errors:
+        state.entry_message = ('error', f"❌ 필수 항목이 입력되지 않았습니다: {', '.join(validation_errors)}")
+        return
+    
+    # 가격 계산
+    unit_price, total_price = calc_prices(price, quantity, state.entry_price_type == '개당 가격')
+    
+    # 새 항목 추가
+    state.records.append({
+        '날짜': pd.Timestamp(purchase_date),
+        '품목': category,
+        '제품명': product_name,
+        '가격': price,
+        '개수': quantity,
+        '개당가격': unit_price,
+        '전체가격': total_price
+    })
+    # 날짜 기준 정렬 상태 유지 (이미 정렬된 리스트라 거의 선형 시간)
+    state.records.sort(key=record_sort_key)
+    mark_data_changed()
+    save_data(get_dataframe())
+    state.entry_message = ('success', f"✅ 항목이 추가되었습니다! (개당 가격: {unit_price:,.0f}원 | 전체 가격: {total_price:,.0f}원)")
+    
+    # 제품명을 포함한 입력 위젯을 기본값으로 초기화
+    for key in ENTRY_WIDGET_KEYS:
+        if key in state:
+            del state[key]
+
 # 세션 상태 초기화
-if 'df' not in st.session_state:
-    st.session_state.df = load_data()
+if 'records' not in st.session_state:
+    st.session_state.records = load_data(os.path.getmtime(DATA_FILE) if os.path.exists(DATA_FILE) else 0.0).to_dict('records')
+    st.session_state.records.sort(key=record_sort_key)
+    mark_data_changed()
 
 # 메인 타이틀
 st.title("💰 가계부 관리 시스템")
@@ -338,92 +580,73 @@ menu = st.sidebar.radio(
 if menu == "가계부 입력":
     st.header("📝 가계부 항목 추가")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        purchase_date = st.date_input("구매 날짜 *", value=date.today())
-        product_name = st.text_input("제품명 *", placeholder="예: 치킨, 버스카드 충전 등")
-        
-        # 제품명 입력 시 품목 추천
-        if product_name:
-            recommended_category = recommend_category(product_name)
-            st.info(f"💡 추천 품목: **{recommended_category}**")
-        
-        category = st.selectbox(
-            "품목 *",
-            options=["식비", "교통비", "쇼핑", "생활비", "의료", "교육", "오락", "기타"],
-            index=7 if not product_name else list(CATEGORY_KEYWORDS.keys()).index(recommended_category) if recommended_category in CATEGORY_KEYWORDS else 7
-        )
-    
-    with col2:
-        price_type = st.radio(
-            "가격 입력 방식",
-            ["개당 가격", "전체 가격"],
-            horizontal=True
-        )
-        
-        price = st.number_input(
-            f"{'개당 가격' if price_type == '개당 가격' else '전체 가격'} *",
-            min_value=0.0,
-            value=0.0,
-            step=100.0
-        )
-        
-        quantity = st.number_input(
-            "개수 *",
-            min_value=1,
-            value=1,
-            step=1
-        )
-    
-    # 가격 계산 미리보기
-    if price > 0 and quantity > 0:
-        if price_type == '개당 가격':
-            unit_price = price
-            total_price = unit_price * quantity
-        else:
-            total_price = price
-            unit_price = total_price / quantity
+    # 제품명은 입력 즉시 품목을 추천할 수 있도록 폼 밖에 둡니다.
+    product_name = st.text_input(
+        "제품명 *",
+        placeholder="예: 치킨, 버스카드 충전 등",
+        key="entry_product_name",
+        on_change=on_product_name_change
+    )
+    if product_name:
+        st.info(f"💡 추천 품목: **{recommend_category(product_name)}**")
+    
+    if 'entry_category' not in st.session_state:
+        st.session_state.entry_category = "기타"
+    
+    # 나머지 항목은 폼으로 묶어 '항목 추가'를 누를 때만 다시 실행되도록 합니다.
+    with st.form("add_entry", clear_on_submit=False):
+        col1, col2 = st.columns(2)
         
-        st.info(f"💰 개당 가격: {unit_price:,.0f}원 | 전체 가격: {total_price:,.0f}원")
-    
-    # 추가 버튼
-    if st.button("✅ 항목 추가", type="primary"):
-        # 필수 항목 검증
-        validation_errors = validate_input(
-            purchase_date, category, product_name, price, quantity
-        )
+        with col1:
+            st.date_input("구매 날짜 *", value=date.today(), key="entry_date")
+            st.selectbox(
+                "품목 *",
+                options=["식비", "교통비", "쇼핑", "생활비", "의료", "교육", "오락", "기타"],
+                key="entry_category"
+            )
         
-        if validation_errors:
-            st.error(f"❌ 필수 항목이 입력되지 않았습니다: {', '.join(validation_errors)}")
-        else:
-            # 가격 계산
-            unit_price, total_price = calculate_price(
-                price, quantity, 'unit' if price_type == '개당 가격' else 'total'
+        with col2:
+            st.radio(
+                "가격 입력 방식",
+                ["개당 가격", "전체 가격"],
+                horizontal=True,
+                key="entry_price_type"
             )
             
-            # 새 항목 추가
-            new_row = pd.DataFrame({
-                '날짜': [purchase_date],
-                '품목': [category],
-                '제품명': [product_name],
-                '가격': [price],
-                '개수': [quantity],
-                '개당가격': [unit_price],
-                '전체가격': [total_price]
-            })
+            st.number_input(
+                "가격 *",
+                min_value=0.0,
+                value=0.0,
+                step=100.0,
+                help="선택한 가격 입력 방식(개당 가격/전체 가격)에 맞는 금액을 입력하세요.",
+                key="entry_price"
+            )
             
-            st.session_state.df = pd.concat([st.session_state.df, new_row], ignore_index=True)
-            st.session_state.df['날짜'] = parse_date_series(st.session_state.df['날짜'])
-            save_data(st.session_state.df)
-            st.success("✅ 항목이 추가되었습니다!")
-            st.rerun()
+            st.number_input(
+                "개수 *",
+                min_value=1,
+                value=1,
+                step=1,
+                key="entry_quantity"
+            )
+        
+        # 검증과 저장은 콜백에서 처리하여 실패 시 입력값이 유지되도록 합니다.
+        st.form_submit_button("✅ 항목 추가", type="primary", on_click=submit_entry)
+    
+    entry_message = st.session_state.pop('entry_message', None)
+    if entry_message:
+        message_type, message = entry_message
+        if message_type == 'error':
+            st.error(message)
+        else:
+            st.success(message)
 
 # 2. 가계부 목록
 elif menu == "가계부 목록":
     st.header("📋 가계부 목록")
+    df = get_dataframe()
     
-    if st.session_state.df.empty:
+    if df.empty:
         st.info("📭 아직 등록된 항목이 없습니다.")
     else:
         # 필터 옵션
@@ -432,33 +655,21 @@ elif menu == "가계부 목록":
         with col1:
             date_filter = st.checkbox("날짜 필터 적용")
             if date_filter:
-                try:
-                    df_dates = parse_date_series(st.session_state.df['날짜'])
-                    min_date = df_dates.min().date() if not df_dates.empty else date.today()
-                    max_date = df_dates.max().date() if not df_dates.empty else date.today()
-                except:
-                    min_date = date.today()
-                    max_date = date.today()
+                min_date, max_date = get_date_bounds()
                 start_date_filter = st.date_input("시작 날짜", value=min_date)
                 end_date_filter = st.date_input("종료 날짜", value=max_date)
         
         with col2:
-            categories = ["전체"] + list(st.session_state.df['품목'].unique()) if not st.session_state.df.empty else ["전체"]
-            selected_category = st.selectbox("품목 필터", categories)
+            selected_category = st.selectbox("품목 필터", ["전체"] + df['품목'].cat.categories.tolist())
         
         with col3:
             search_product = st.text_input("제품명 검색", placeholder="제품명으로 검색...")
         
         # 데이터 필터링
-        filtered_df = st.session_state.df.copy()
-        if not filtered_df.empty:
-            filtered_df['날짜'] = parse_date_series(filtered_df['날짜'])
+        filtered_df = df
         
         if date_filter and not filtered_df.empty:
-            filtered_df = filtered_df[
-                (filtered_df['날짜'] >= pd.to_datetime(start_date_filter)) &
-                (filtered_df['날짜'] <= pd.to_datetime(end_date_filter))
-            ]
+            filtered_df = filter_by_date(filtered_df, start_date_filter, end_date_filter)
         
         if selected_category != "전체" and not filtered_df.empty:
             filtered_df = filtered_df[filtered_df['품목'] == selected_category]
@@ -471,15 +682,14 @@ elif menu == "가계부 목록":
             st.info("📭 필터 조건에 맞는 항목이 없습니다.")
         else:
             # 표시용 데이터프레임 (인덱스 포함)
-            display_df = filtered_df.copy()
-            display_df['날짜'] = parse_date_series(display_df['날짜']).dt.strftime('%Y-%m-%d')
-            display_df = display_df[['날짜', '품목', '제품명', '개수', '개당가격', '전체가격']]
+            # 날짜/숫자 포맷팅은 assign으로 새 프레임에 적용
+            display_df = filtered_df[['날짜', '품목', '제품명', '개수', '개당가격', '전체가격']].assign(
+                날짜=filtered_df['날짜'].dt.strftime('%Y-%m-%d'),
+                개당가격=filtered_df['개당가격'].map("{:,.0f}".format),
+                전체가격=filtered_df['전체가격'].map("{:,.0f}".format)
+            )
             display_df.columns = ['날짜', '품목', '제품명', '개수', '개당가격(원)', '전체가격(원)']
             
-            # 숫자 포맷팅
-            display_df['개당가격(원)'] = display_df['개당가격(원)'].apply(lambda x: f"{x:,.0f}")
-            display_df['전체가격(원)'] = display_df['전체가격(원)'].apply(lambda x: f"{x:,.0f}")
-            
             st.dataframe(display_df, use_container_width=True)
             
             # 통계 요약
@@ -489,111 +699,76 @@ elif menu == "가계부 목록":
             # 삭제 기능
             st.subheader("항목 삭제")
             if not filtered_df.empty:
+                # 선택지 라벨은 한 번만 만들어 두고 조회만 합니다.
+                delete_labels = {
+                    row.Index: f"{row.Index}: {row.제품명} - {row.전체가격:,.0f}원"
+                    for row in filtered_df[['제품명', '전체가격']].itertuples()
+                }
                 delete_indices = st.multiselect(
                     "삭제할 항목 선택 (인덱스)",
-                    options=filtered_df.index.tolist(),
-                    format_func=lambda x: f"{x}: {filtered_df.loc[x, '제품명']} - {filtered_df.loc[x, '전체가격']:,.0f}원"
+                    options=list(delete_labels),
+                    format_func=delete_labels.__getitem__
                 )
                 
                 if st.button("🗑️ 선택한 항목 삭제", type="secondary"):
                     if delete_indices:
-                        st.session_state.df = st.session_state.df.drop(delete_indices)
-                        st.session_state.df = st.session_state.df.reset_index(drop=True)
-                        save_data(st.session_state.df)
+                        drop_set = set(delete_indices)
+                        st.session_state.records = [
+                            record for i, record in enumerate(st.session_state.records) if i not in drop_set
+                        ]
+                        mark_data_changed()
+                        save_data(get_dataframe())
                         st.success("✅ 항목이 삭제되었습니다!")
                         st.rerun()
 
 # 3. 통계 및 그래프
 elif menu == "통계 및 그래프":
     st.header("📊 통계 및 그래프")
+    df = get_dataframe()
     
-    if st.session_state.df.empty:
+    if df.empty:
         st.info("📭 통계를 표시할 데이터가 없습니다.")
     else:
         # 기간 선택
+        min_date, max_date = get_date_bounds()
         col1, col2 = st.columns(2)
         with col1:
-            df_dates = parse_date_series(st.session_state.df['날짜'])
-            start_date = st.date_input(
-                "시작 날짜",
-                value=df_dates.min().date() if not df_dates.empty else date.today()
-            )
+            start_date = st.date_input("시작 날짜", value=min_date)
         with col2:
-            end_date = st.date_input(
-                "종료 날짜",
-                value=df_dates.max().date() if not df_dates.empty else date.today()
-            )
+            end_date = st.date_input("종료 날짜", value=max_date)
         
         # 품목 선택
-        categories = ["전체"] + list(st.session_state.df['품목'].unique()) if not st.session_state.df.empty else ["전체"]
-        selected_category = st.selectbox("품목 선택", categories)
+        selected_category = st.selectbox("품목 선택", ["전체"] + df['품목'].cat.categories.tolist())
         
         # 데이터 필터링
-        filtered_df = st.session_state.df.copy()
-        filtered_df['날짜'] = parse_date_series(filtered_df['날짜'])
-        filtered_df = filtered_df[
-            (filtered_df['날짜'] >= pd.to_datetime(start_date)) &
-            (filtered_df['날짜'] <= pd.to_datetime(end_date))
-        ]
-        
-        if selected_category != "전체":
-            filtered_df = filtered_df[filtered_df['품목'] == selected_category]
+        filtered_df = get_filtered_dataframe(start_date, end_date, selected_category)
         
         if filtered_df.empty:
             st.info("📭 선택한 조건에 맞는 데이터가 없습니다.")
         else:
             # 표 형식 표시
             st.subheader("📋 지출 내역 표")
-            display_df = filtered_df[['날짜', '품목', '제품명', '개수', '전체가격']].copy()
-            display_df['날짜'] = display_df['날짜'].dt.strftime('%Y-%m-%d')
+            display_df = filtered_df[['날짜', '품목', '제품명', '개수', '전체가격']].assign(
+                날짜=filtered_df['날짜'].dt.strftime('%Y-%m-%d'),
+                전체가격=filtered_df['전체가격'].map("{:,.0f}".format)
+            )
             display_df.columns = ['날짜', '품목', '제품명', '개수', '지출액(원)']
-            display_df['지출액(원)'] = display_df['지출액(원)'].apply(lambda x: f"{x:,.0f}")
             st.dataframe(display_df, use_container_width=True)
             
             # 그래프
             st.subheader("📈 지출 그래프")
             
-            # 1. 날짜별 지출 추이
-            daily_expenditure = filtered_df.groupby(filtered_df['날짜'].dt.date)['전체가격'].sum().reset_index()
-            daily_expenditure.columns = ['날짜', '지출액']
+            figure_key = (st.session_state.data_version, start_date, end_date, selected_category)
             
-            fig1 = px.line(
-                daily_expenditure,
-                x='날짜',
-                y='지출액',
-                title=f"{selected_category} 일별 지출 추이",
-                markers=True
-            )
-            fig1.update_layout(xaxis_title="날짜", yaxis_title="지출액 (원)")
-            st.plotly_chart(fig1, use_container_width=True)
+            # 1. 날짜별 지출 추이
+            st.plotly_chart(build_daily_line_fig(*figure_key), use_container_width=True)
             
             # 2. 품목별 지출 파이 차트
             if selected_category == "전체":
-                category_expenditure = filtered_df.groupby('품목')['전체가격'].sum().reset_index()
-                category_expenditure.columns = ['품목', '지출액']
-                
-                fig2 = px.pie(
-                    category_expenditure,
-                    values='지출액',
-                    names='품목',
-                    title="품목별 지출 비율"
-                )
-                st.plotly_chart(fig2, use_container_width=True)
+                st.plotly_chart(build_category_pie_fig(*figure_key), use_container_width=True)
             
             # 3. 품목별 지출 막대 그래프
-            category_expenditure = filtered_df.groupby('품목')['전체가격'].sum().sort_values(ascending=False).reset_index()
-            category_expenditure.columns = ['품목', '지출액']
-            
-            fig3 = px.bar(
-                category_expenditure,
-                x='품목',
-                y='지출액',
-                title="품목별 지출액",
-                text='지출액'
-            )
-            fig3.update_traces(texttemplate='%{text:,.0f}원', textposition='outside')
-            fig3.update_layout(xaxis_title="품목", yaxis_title="지출액 (원)")
-            st.plotly_chart(fig3, use_container_width=True)
+            st.plotly_chart(build_category_bar_fig(*figure_key), use_container_width=True)
             
             # 통계 요약
             st.subheader("📊 통계 요약")
@@ -616,25 +791,17 @@ elif menu == "통계 및 그래프":
 # 4. AI 분석
 elif menu == "AI 분석":
     st.header("🤖 AI 분석")
+    df = get_dataframe()
     
-    if st.session_state.df.empty:
+    if df.empty:
         st.info("📭 분석할 데이터가 없습니다.")
     else:
         # 기간 선택
+        min_date, max_date = get_date_bounds()
         col1, col2 = st.columns(2)
         with col1:
-            try:
-                df_dates = parse_date_series(st.session_state.df['날짜'])
-                min_date = df_dates.min().date() if not df_dates.empty else date.today()
-            except:
-                min_date = date.today()
             start_date = st.date_input("분석 시작 날짜", value=min_date, key="ai_start")
         with col2:
-            try:
-                df_dates = parse_date_series(st.session_state.df['날짜'])
-                max_date = df_dates.max().date() if not df_dates.empty else date.today()
-            except:
-                max_date = date.today()
             end_date = st.date_input("분석 종료 날짜", value=max_date, key="ai_end")
         
         # 사용자 쿼리 입력
@@ -648,7 +815,7 @@ elif menu == "AI 분석":
             if user_query:
                 # 기본 분석 결과
                 basic_analysis = analyze_expenditure(
-                    st.session_state.df,
+                    st.session_state.data_version,
                     start_date,
                     end_date
                 )
@@ -658,7 +825,7 @@ elif menu == "AI 분석":
                 
                 # AI 분석 결과
                 ai_result = ai_analysis(
-                    st.session_state.df,
+                    st.session_state.data_version,
                     start_date,
                     end_date,
                     user_query
@@ -10,7 +10,8 @@ def check_and_install_requirements():
     required_packages = {
         'streamlit': 'streamlit',
         'pandas': 'pandas',
-        'plotly': 'plotly'
+        'plotly': 'plotly',
+        'orjson': 'orjson'
     }
     
     missing_packages = []